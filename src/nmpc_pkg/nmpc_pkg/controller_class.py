@@ -32,6 +32,7 @@ class Controller:
         #history of states and controls
         self.next_states = None
         self.u0 = np.zeros((self.N, 2))
+        self.success = False
 
         #set up optimisation problem
         self.setup_controller()
@@ -107,11 +108,15 @@ class Controller:
         self.opti.subject_to(self.opti.bounded(self.min_w, w, self.max_w))
 
         #configure solver (IPOPT)
+        #jit-compile the generated nlp evaluation code to c with -O3 at startup
         opts_setting = {'ipopt.max_iter':2000,
                         'ipopt.print_level':0,
                         'print_time':0,
                         'ipopt.acceptable_tol':1e-8,
-                        'ipopt.acceptable_obj_change_tol':1e-6}
+                        'ipopt.acceptable_obj_change_tol':1e-6,
+                        'jit':True,
+                        'compiler':'shell',
+                        'jit_options':{'flags':['-O3'], 'verbose':False}}
 
         self.opti.solver('ipopt', opts_setting)
 
@@ -124,20 +129,28 @@ class Controller:
         self.opti.set_value(self.opt_x_ref, next_trajectories)
         self.opti.set_value(self.opt_u_ref, next_controls)
 
-        #initial guess
-        self.next_states = np.zeros((self.N+1, 3))
-        self.next_states[0] = current_state
-        for i in range(1, self.N+1):
-            prev_state = self.next_states[i-1]
-            prev_control = self.u0[i-1] if i > 1 else next_controls[0]
-            self.next_states[i] = prev_state + np.array([
-                np.cos(prev_state[2]) * prev_control[0],
-                np.sin(prev_state[2]) * prev_control[0],
-                prev_control[1]
-            ]) * self.T
-
-        #unwrap angles
-        self.next_states[:, 2] = np.unwrap(self.next_states[:, 2])
+        #warm start: shift the previous solution forward one step if available
+        if self.success:
+            self.next_states = np.roll(self.next_states, -1, axis=0)
+            self.next_states[-1] = self.next_states[-2]
+            self.next_states[0] = current_state
+            self.u0 = np.roll(self.u0, -1, axis=0)
+            self.u0[-1] = self.u0[-2]
+        else:
+            #cold start: roll the kinematic model out from the current state
+            self.next_states = np.zeros((self.N+1, 3))
+            self.next_states[0] = current_state
+            for i in range(1, self.N+1):
+                prev_state = self.next_states[i-1]
+                prev_control = self.u0[i-1] if i > 1 else next_controls[0]
+                self.next_states[i] = prev_state + np.array([
+                    np.cos(prev_state[2]) * prev_control[0],
+                    np.sin(prev_state[2]) * prev_control[0],
+                    prev_control[1]
+                ]) * self.T
+
+            #unwrap angles
+            self.next_states[:, 2] = np.unwrap(self.next_states[:, 2])
 
         #set initial guess
         self.opti.set_initial(self.opt_states, self.next_states)
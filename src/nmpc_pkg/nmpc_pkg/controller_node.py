@@ -1,14 +1,23 @@
 #!/usr/bin/env python3
 import numpy as np
-import csv
+import math
+from scipy.spatial import cKDTree
+from numba import njit
 import socket
-import json
+import orjson
+import threading
+import queue
 import time
 import rclpy
 from rclpy.node import Node
 from nav_msgs.msg import Odometry
 from geometry_msgs.msg import Twist
-from .controller_class import Controller  
+from .controller_class import Controller
+
+@njit(cache=True, fastmath=True)
+def yaw_from_quat(x, y, z, w):
+#compute yaw from a quaternion (roll and pitch are not needed)
+    return math.atan2(2 * (w * z + x * y), 1 - 2 * (y * y + z * z))
 
 class NMPCNode(Node):
     PLOTTER_ADDRESS = ('192.168.131.61', 12345)     #hardcoded ip address for external plotter
@@ -38,8 +47,8 @@ class NMPCNode(Node):
         self.csv_file = self.get_parameter('trajectory_file').value
 
     def _init_state_variables(self):
-        #initialise state variables
-        self.current_state = None
+        #initialise state variables (buffer reused across odometry callbacks)
+        self.current_state = np.empty(3, dtype=np.float64)
 
         #initialise previous control
         self.previous_control = np.zeros(2)
@@ -49,21 +58,37 @@ class NMPCNode(Node):
         
         #load reference trajectory from csv file
         self.reference_trajectory = self.load_trajectory()
-          
+
+        #precompute search structures for closest-point lookups
+        self.ref_xy = np.ascontiguousarray(self.reference_trajectory[:, :2])
+        self.ref_angles_unwrapped = np.unwrap(self.reference_trajectory[:, 2])
+        self.kdtree = cKDTree(self.ref_xy)
+
+        #cache for closest-point search, valid until the next odometry update
+        self._closest_cache = (None, None)
+
     def _init_communication(self):
         #initialise ROS publishers and subscribers
         self.cmd_vel_pub = self.create_publisher(Twist, '/a200_0656/twist_marker_server/cmd_vel', 10)
         self.odom_sub = self.create_subscription(Odometry, '/camera_odom', self.odom_callback, 10)
 
+        #velocity command message reused across control ticks
+        self._cmd_vel_msg = Twist()
+
         #wait for initial position
         self.initial_position_received = False
         self.initial_position = None
         while not self.initial_position_received:
-            rclpy.spin_once(self)
+            rclpy.spin_once(self, timeout_sec=0.1)
     
         #create udp socket to send trajectory data to external plotter
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    
+
+        #background worker so udp sends never block the control loop
+        self._udp_queue = queue.Queue(maxsize=1)
+        self._udp_thread = threading.Thread(target=self._udp_worker, daemon=True)
+        self._udp_thread.start()
+
     def _init_controller(self):
         #get controller parameters
         min_v = self.get_parameter('min_v').value
@@ -76,6 +101,12 @@ class NMPCNode(Node):
         #initialise nmpc controller with initial position and parameters
         self.controller = Controller(min_v, max_v, min_w, max_w, N, T=1.0/self.rate)
         self.trajectory_index = None
+
+        #preallocated buffer for the reference controls passed to the solver
+        self._ref_controls_buf = np.zeros((self.controller.N, 2))
+
+        #precomputed horizon index offsets for reference_trajectory_N
+        self._horizon_offsets = np.arange(self.controller.N + 1, dtype=np.int64)
         
         #timer for control loop
         self.timer = self.create_timer(1.0/self.rate, self.control_loop)
@@ -93,30 +124,28 @@ class NMPCNode(Node):
         if self.x_position == 0.0 and self.y_position == 0.0:
             return
         
-        #extract current orientation and convert to euler angles
+        #extract current orientation and convert to yaw
         orientation_q = msg.pose.pose.orientation
-        _, _, self.yaw = self.euler_from_quaternion([orientation_q.x, orientation_q.y, orientation_q.z, orientation_q.w])
+        self.yaw = yaw_from_quat(orientation_q.x, orientation_q.y, orientation_q.z, orientation_q.w)
+
+        #update current state in place
+        self.current_state[0] = self.x_position
+        self.current_state[1] = self.y_position
+        self.current_state[2] = self.yaw
 
-        #update current state
-        self.current_state = np.array([self.x_position, self.y_position, self.yaw])
+        #invalidate closest-point cache for the new state
+        self._closest_cache = (None, None)
 
-        #set initial position 
+        #set initial position
         if not self.initial_position_received:
-            self.initial_position = self.current_state
+            self.initial_position = self.current_state.copy()
             self.initial_position_received = True
             
         self.odom_received = True
 
     def load_trajectory(self):
-    #function to load reference trajectory from csv file
-        reference_trajectory = []
-        with open(self.csv_file, 'r') as file:
-            csv_reader = csv.reader(file)
-            next(csv_reader)
-            for row in csv_reader:
-                x, y, theta = map(float, row)
-                reference_trajectory.append([x, y, theta])
-        return np.array(reference_trajectory)
+    #function to load reference trajectory from csv file (header row skipped)
+        return np.loadtxt(self.csv_file, delimiter=',', skiprows=1, dtype=np.float64, ndmin=2)
     
     def scale_N(self, trajectory):
     #function to scale N according to length of trajectory
@@ -131,44 +160,34 @@ class NMPCNode(Node):
 
         return N
 
-    def euler_from_quaternion(self, quaternion):
-    #function to convert quarternion to euler angles
-        x, y, z, w = quaternion
-        sinr_cosp = 2 * (w * x + y * z)
-        cosr_cosp = 1 - 2 * (x * x + y * y)
-        roll = np.arctan2(sinr_cosp, cosr_cosp)
-
-        sinp = 2 * (w * y - z * x)
-        pitch = np.arcsin(sinp)
-
-        siny_cosp = 2 * (w * z + x * y)
-        cosy_cosp = 1 - 2 * (y * y + z * z)
-        yaw = np.arctan2(siny_cosp, cosy_cosp)
-
-        return roll, pitch, yaw
-
     def find_closest_point_index(self, current_state):
+        #return cached result if the state is unchanged since the last search
+        cache_key, cached_index = self._closest_cache
+        if cache_key is not None and cache_key == current_state.tobytes():
+            return cached_index
+
         #extract the position and yaw from the current state
         pos = current_state[:2]
         yaw = current_state[2]
 
-        #euclidean distances to each reference point
-        distances = np.linalg.norm(self.reference_trajectory[:, :2] - pos, axis=1)
-    
-        #unwrap reference orientations to avoid discontinuities
-        ref_angles = np.unwrap(self.reference_trajectory[:, 2])
-    
-        #orientation difference
+        #query kd-tree for nearest candidate points (k=1 results are squeezed to scalars)
+        k = min(32, len(self.reference_trajectory))
+        distances, candidates = self.kdtree.query(pos, k=k)
+        distances = np.atleast_1d(distances)
+        candidates = np.atleast_1d(candidates)
+
+        #orientation difference for candidate points only
+        ref_angles = self.ref_angles_unwrapped[candidates]
         angle_diffs = np.abs(np.arctan2(np.sin(ref_angles - yaw), np.cos(ref_angles - yaw)))
-    
+
         #weight to balance distance and orientation difference
         weight = 0.2
-    
+
         #combined cost
         cost = distances + weight * angle_diffs
 
         #find index of closest point
-        closest_index = np.argmin(cost)
+        closest_index = candidates[np.argmin(cost)]
     
         #check if close to end of trajectory
         if closest_index >= len(self.reference_trajectory) - self.controller.N:
@@ -180,65 +199,82 @@ class NMPCNode(Node):
             #if close to end of trajectory and repeat is requested
             elif self.path_type == 'repeat':
                 print('Return to start')
-                return 1
+                closest_index = 1
+
+        #store result for repeated lookups within the same tick
+        self._closest_cache = (current_state.tobytes(), closest_index)
 
         print('Index: ', closest_index)
         return closest_index
     
     def reference_trajectory_N(self):
     #function to retrieve next N steps of the reference trajectory
-        #get index of closest point
-        closest_index = self.find_closest_point_index(self.current_state)
+        #get index of closest point (stored for reuse in send_data)
+        self.closest_index = closest_index = self.find_closest_point_index(self.current_state)
 
         N = self.controller.N
         total_points = len(self.reference_trajectory)
-        
-        #create an array to hold N+1 points
-        ref_traj = np.zeros((N+1, 3))
-        
-        for i in range(N+1):
-            index = (closest_index + i) % total_points
-            ref_traj[i] = self.reference_trajectory[index]
 
-        #unwrap angles in reference trajectory
-        ref_traj[:, 2] = np.unwrap(ref_traj[:, 2])
-        
+        #gather the next N+1 points using the precomputed offsets
+        idx = closest_index + self._horizon_offsets
+        if closest_index + N + 1 > total_points:
+            #only wrap indices when the horizon crosses the end of the trajectory
+            idx %= total_points
+        ref_traj = self.reference_trajectory[idx].copy()
+
+        #use the unwrapped angles cached at load time
+        ref_traj[:, 2] = self.ref_angles_unwrapped[idx]
+
         return ref_traj
 
     def send_data(self):
     #function to send trajectory data to external plotter
 
-        closest_index = self.find_closest_point_index(self.current_state)
-        closest_point = self.reference_trajectory[closest_index]
+        #reuse the closest index computed by reference_trajectory_N this tick
+        closest_point = self.reference_trajectory[self.closest_index]
 
         trajectory_data ={
-            'actual_x' : float(self.current_state[0]),
-            'actual_y' : float(self.current_state[1]),
-            'forecast_x': self.controller.next_states[:, 0].tolist() if hasattr(self.controller, 'next_states') else [],
-            'forecast_y': self.controller.next_states[:, 1].tolist() if hasattr(self.controller, 'next_states') else [], 
-            'closest_x' : float(closest_point[0]),
-            'closest_y' : float(closest_point[1]),
-            'optimisation_time' : float(self.time_taken)
+            'actual_x' : self.current_state[0],
+            'actual_y' : self.current_state[1],
+            'forecast_x': np.ascontiguousarray(self.controller.next_states[:, 0]) if hasattr(self.controller, 'next_states') else [],
+            'forecast_y': np.ascontiguousarray(self.controller.next_states[:, 1]) if hasattr(self.controller, 'next_states') else [],
+            'closest_x' : closest_point[0],
+            'closest_y' : closest_point[1],
+            'optimisation_time' : self.time_taken
         }
 
-        #send data as json encoded udp
-        self.socket.sendto(json.dumps(trajectory_data).encode(), self.PLOTTER_ADDRESS)
+        #queue data for the udp worker, dropping the stale payload if it is still pending
+        payload = orjson.dumps(trajectory_data, option=orjson.OPT_SERIALIZE_NUMPY)
+        try:
+            self._udp_queue.put_nowait(payload)
+        except queue.Full:
+            try:
+                self._udp_queue.get_nowait()
+            except queue.Empty:
+                pass
+            self._udp_queue.put_nowait(payload)
+
+    def _udp_worker(self):
+    #background thread that sends queued trajectory data to the external plotter
+        while True:
+            payload = self._udp_queue.get()
+            try:
+                self.socket.sendto(payload, self.PLOTTER_ADDRESS)
+            except OSError:
+                #socket closed during shutdown
+                break
 
     def unwrap_current_state(self, current_state, ref_trajectory):
         #unwrap current yaw relative to reference trajectory
         ref_angle = ref_trajectory[0, 2]
         current_angle = current_state[2]
-    
+
         #calculate difference
         diff = current_angle - ref_angle
-    
-        #adjust for wrap-around
-        if abs(diff) > np.pi:
-            if diff > 0:
-                current_angle -= 2 * np.pi
-            else:
-                current_angle += 2 * np.pi
-    
+
+        #adjust for wrap-around (branchless: subtract the nearest whole turn)
+        current_angle -= 2 * np.pi * np.round(diff / (2 * np.pi))
+
         return np.array([current_state[0], current_state[1], current_angle])
 
     def control_loop(self):
@@ -255,24 +291,25 @@ class NMPCNode(Node):
             #get reference trajectory for next N steps
             ref_trajectory = self.reference_trajectory_N()
 
-            #create array of reference controls based on previous controls (ie minimise change in control)
-            ref_controls = np.tile(self.previous_control, (self.controller.N, 1))
+            #fill reference controls buffer from previous controls (ie minimise change in control)
+            self._ref_controls_buf[:] = self.previous_control
+            ref_controls = self._ref_controls_buf
 
             #unwrap current state
             current_state_unwrapped = self.unwrap_current_state(self.current_state, ref_trajectory)
         
-            #log start time
-            start_time = time.time()
+            #log start time (monotonic clock, immune to ntp adjustments)
+            start_time = time.perf_counter_ns()
 
             #solve nmpc problem
             self.optimal_control = self.controller.solve(current_state_unwrapped, ref_trajectory, ref_controls)
 
             #log end time and compute time taken for optimisation calculation
-            end_time = time.time()
-            self.time_taken = end_time - start_time
+            end_time = time.perf_counter_ns()
+            self.time_taken = (end_time - start_time) * 1e-9
         
-            #create and publish velocity command
-            cmd_vel_msg = Twist()
+            #fill and publish the reused velocity command message
+            cmd_vel_msg = self._cmd_vel_msg
             if self.stop == True:
                 #stop
                 cmd_vel_msg.linear.x = 0.0
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 import numpy as np
 import csv
+import math
+from numba import njit
 import socket
 import json
 import rclpy
@@ -23,6 +25,21 @@ from rclpy.qos import (
 )
 from rclpy.duration import Duration
 
+@njit(cache=True, fastmath=True)
+def closest_point_cost_argmin(ref_x, ref_y, ref_theta, px, py, yaw, weight):
+#fused single-pass argmin over the closest-point cost, no intermediate arrays
+   best_cost = np.inf
+   best_index = 0
+   for i in range(ref_x.shape[0]):
+      dx = ref_x[i] - px
+      dy = ref_y[i] - py
+      angle_diff = abs(math.atan2(math.sin(ref_theta[i] - yaw), math.cos(ref_theta[i] - yaw)))
+      cost = dx*dx + dy*dy + weight*angle_diff
+      if cost < best_cost:
+         best_cost = cost
+         best_index = i
+   return best_index
+
 class SwitchingNMPCNode(Node):
    PLOTTER_ADDRESS = ('196.24.167.82', 12345)
 
@@ -74,6 +91,11 @@ class SwitchingNMPCNode(Node):
          self.get_logger().error(f"Failed to load trajectory: {e}")
          self.reference_trajectory = np.array([[0.0, 0.0, 0.0]])
 
+      #split trajectory into contiguous per-column buffers for the closest-point scan
+      self.ref_x = np.ascontiguousarray(self.reference_trajectory[:, 0])
+      self.ref_y = np.ascontiguousarray(self.reference_trajectory[:, 1])
+      self.ref_theta = np.ascontiguousarray(np.unwrap(self.reference_trajectory[:, 2]))
+
       #initialise navigan trajectory
       self.path_points = []
       self.navigan_x = []
@@ -253,23 +275,11 @@ class SwitchingNMPCNode(Node):
       pos = current_state[:2]
       yaw = current_state[2]
 
-      #euclidean distances to each reference point
-      distances = np.linalg.norm(self.reference_trajectory[:, :2] - pos, axis=1)
-    
-      #unwrap reference orientations to avoid discontinuities
-      ref_angles = np.unwrap(self.reference_trajectory[:, 2])
-    
-      #orientation difference
-      angle_diffs = np.abs(np.arctan2(np.sin(ref_angles - yaw), np.cos(ref_angles - yaw)))
-    
-      #weight to balance distance and orientation difference
-      weight = 0.2
-    
-      #combined cost
-      cost = distances + weight * angle_diffs
+      #weight to balance distance and orientation difference (rescaled for squared distances)
+      weight = 0.05
 
-      #find index of closest point
-      closest_index = np.argmin(cost)
+      #find index of closest point with the fused numba kernel
+      closest_index = closest_point_cost_argmin(self.ref_x, self.ref_y, self.ref_theta, pos[0], pos[1], yaw, weight)
     
       #check if close to end of trajectory
       if closest_index >= len(self.reference_trajectory) - self.controller.N: